@@ -0,0 +1,148 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from .repository import Repository
+
+
+class LanguageMatrix:
+    """ Repository x language matrix for bulk language statistics
+
+    Stored sparse, row by row (CSR): the values of row i are
+    values[indptr[i]:indptr[i + 1]], in the columns given by the same slice
+    of indices. A row holds bytes when the vendor gives them (Github) and
+    percentages otherwise (Gitlab), see `in_bytes`.
+    """
+
+    def __init__(self, repositories, languages, indptr, indices, values, in_bytes):
+        self.repositories = repositories  # Row keys
+        self.languages = languages  # Column names
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.in_bytes = in_bytes
+        self._rows = {key: i for i, key in enumerate(repositories)}
+
+        # Row sums, to normalize rows without going through them twice
+        self.row_totals = array('d', bytes(8 * len(repositories)))
+        for i in range(len(repositories)):
+            self.row_totals[i] = sum(values[indptr[i]:indptr[i + 1]])
+
+    @classmethod
+    def from_rows(cls, rows):
+        # rows: iterable of (key, {lang: value}, in_bytes)
+        columns = {}
+        keys = []
+        indptr = array('L', [0])
+        indices = array('L')
+        values = array('d')
+        in_bytes = array('B')
+
+        for key, languages, is_bytes in rows:
+            for lang, value in languages.items():
+                if not value:
+                    continue
+                if lang not in columns:
+                    columns[lang] = len(columns)
+                indices.append(columns[lang])
+                values.append(value)
+            indptr.append(len(values))
+            in_bytes.append(bool(is_bytes))
+            keys.append(key)
+
+        return cls(keys, list(columns), indptr, indices, values, in_bytes)
+
+    def row(self, key):
+        i = self._rows[key]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return {self.languages[column]: value
+                for column, value in zip(self.indices[start:end], self.values[start:end])}
+
+    def _rows_of(self, keys=None):
+        if keys is None:
+            return range(len(self.repositories))
+        return [self._rows[key] for key in keys]
+
+    def _accumulate(self, rows, normalize):
+        # Sums the rows into a single array, in place
+        indptr, indices, values = self.indptr, self.indices, self.values
+        acc = array('d', bytes(8 * len(self.languages)))
+        count = 0
+        for i in rows:
+            if normalize:
+                scale = self.row_totals[i]
+                if not scale:
+                    continue
+            else:
+                if not self.in_bytes[i]:
+                    continue
+                scale = 1
+            for k in range(indptr[i], indptr[i + 1]):
+                acc[indices[k]] += values[k] / scale
+            count += 1
+        return (acc, count)
+
+    def totals(self, keys=None):
+        """ Total bytes per language, for the rows that have bytes """
+
+        acc, _ = self._accumulate(self._rows_of(keys), normalize=False)
+        return {lang: total for lang, total in zip(self.languages, acc) if total}
+
+    def shares(self, keys=None):
+        """ Percentage per language, each repository weighing the same
+
+        Works across vendors as every row is normalized first.
+        """
+
+        acc, count = self._accumulate(self._rows_of(keys), normalize=True)
+        if not count:
+            return {}
+        return {lang: round(share * 100 / count, 2)
+                for lang, share in zip(self.languages, acc) if share}
+
+    def group_by(self, key_func, method='shares'):
+        """ Aggregates rows grouped by key_func(repository key)
+
+        method is either 'shares' or 'totals'.
+        """
+
+        groups = {}
+        for key in self.repositories:
+            groups.setdefault(key_func(key), []).append(key)
+
+        aggregate = getattr(self, method)
+        return {group: aggregate(keys) for group, keys in groups.items()}
+
+
+def _fetch_languages(url, vendor, settings, debug=False):
+    repository = Repository(url=url, vendor=vendor, settings=settings, debug=debug)
+    languages = repository.get_languages_bytes()
+    if languages is not None:
+        return (languages, True)
+    return (repository.get_languages(), False)
+
+
+def get_languages_matrix(repositories, settings={}, max_workers=8, debug=False):
+    """ Fetches the languages of many repositories concurrently
+
+    repositories is an iterable of (url, vendor). Returns the matrix, keyed
+    by url, and a {url: exception} dict of the repositories that failed.
+    """
+
+    repositories = list(repositories)
+    rows = []
+    errors = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (url, executor.submit(_fetch_languages, url, vendor, settings, debug))
+            for url, vendor in repositories
+        ]
+        for url, future in futures:
+            try:
+                languages, in_bytes = future.result()
+            except Exception as e:
+                errors[url] = e
+                continue
+            rows.append((url, languages, in_bytes))
+
+    return (LanguageMatrix.from_rows(rows), errors)
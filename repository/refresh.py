@@ -0,0 +1,369 @@
+""" Keeps the data of a catalog of repositories warm in a cache directory
+
+    python -m repository.refresh catalog.json --settings settings.json --output cache/
+
+The catalog is a JSON list of {"url": ..., "vendor": ..., "popularity": ...}.
+Each repository is refreshed more often the more popular it is, the most
+stale first, with a limited number of concurrent refreshes per host and a
+margin kept under the hosts rate limit (or under a refresh budget when the
+host doesn't tell its quota). Cached data is read with load().
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import logging
+import os
+import queue
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from .repository import Repository
+from .vendors.models import json_default
+from .vendors.tokens import get_token_pool
+from .vendors.utils import is_pending
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHODS = [
+    'get_readme',
+    'get_summary',
+    'get_languages',
+    'get_commits_contributors',
+]
+
+
+def cache_path(directory, url):
+    name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(directory, '{}.json'.format(name))
+
+
+def load(directory, url):
+    # Returns the cached data of a repository, None if it isn't cached yet
+    try:
+        with open(cache_path(directory, url)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def store(directory, url, vendor, data):
+    path = cache_path(directory, url)
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'url': url,
+            'vendor': vendor,
+            'refreshed_at': time.time(),
+            'data': data,
+        }, f, default=json_default)
+    # Readers never see a partially written file
+    os.replace(tmp_path, path)
+
+
+class TokenBucket:
+    """ Allows `rate` operations per second, in bursts of `capacity` """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.time()
+
+    def _fill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, now=None):
+        now = time.time() if now is None else now
+        self._fill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def delay(self, now=None):
+        # Seconds until the next operation is allowed
+        now = time.time() if now is None else now
+        self._fill(now)
+        return max(0, (1 - self.tokens) / self.rate)
+
+
+class Refresher:
+
+    def __init__(self, catalog, settings, directory,
+                 methods=DEFAULT_METHODS,
+                 workers=4,
+                 per_host=2,
+                 margin=0.2,
+                 min_interval=600,
+                 max_interval=86400,
+                 retry_delay=60,
+                 host_budget=600,
+                 pending_tries=5,
+                 debug=False):
+
+        self.catalog = catalog
+        self.settings = settings
+        self.directory = directory
+        self.methods = methods
+        self.workers = workers
+        self.per_host = per_host
+        self.margin = margin
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_delay = retry_delay
+        self.host_budget = host_budget  # Refreshes per hour, for unknown quotas
+        self.pending_tries = pending_tries  # Retries of data still being computed
+        self.debug = debug
+
+        self._heap = []
+        self._counter = 0
+        self._done = queue.Queue()
+        self._running = {}  # Refreshes in progress per host
+        self._buckets = {}  # Refresh budget per host
+        self._failures = {}  # Consecutive failures per url
+        self._pending = {}  # (pending methods, retries) per url
+        self._stop = threading.Event()
+
+    def interval(self, entry):
+        # Popular repositories are refreshed more often
+        popularity = max(entry.get('popularity', 0), 0)
+        return max(self.min_interval, self.max_interval / (1 + popularity))
+
+    def _push(self, due, entry):
+        # Ties are broken by popularity, then catalog order
+        self._counter += 1
+        heapq.heappush(self._heap, (due, -entry.get('popularity', 0), self._counter, entry))
+
+    def retry_interval(self, entry):
+        # Exponential backoff on consecutive failures
+        failures = self._failures.get(entry['url'], 1)
+        return min(self.retry_delay * 2 ** (failures - 1), self.max_interval)
+
+    def _schedule_initial(self, once=False):
+        now = time.time()
+        for entry in self.catalog:
+            cached = load(self.directory, entry['url'])
+            if once:
+                due = now
+            elif cached is None:
+                # Spreading a cold start instead of refreshing all at once
+                due = now + random.uniform(0, self.min_interval)
+            else:
+                due = cached['refreshed_at'] + self.interval(entry)
+            self._push(due, entry)
+
+    def _host(self, entry):
+        parsed = urlparse(entry['url'])
+        return parsed.scheme + '://' + parsed.netloc
+
+    def _throttle(self, entry, now):
+        """ Returns the seconds to wait before refreshing entry on its host
+
+        Known quotas (e.g. Github) are kept above the margin, otherwise
+        refreshes are limited to the host budget, less the margin.
+        """
+
+        host = self._host(entry)
+        pool = get_token_pool(entry['vendor'], host, self.settings)
+        remaining, limit = pool.quota()
+        if limit > 0:
+            return self.retry_delay if remaining < limit * self.margin else 0
+
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate = self.host_budget * (1 - self.margin) / 3600
+            bucket = self._buckets[host] = TokenBucket(rate, capacity=self.per_host)
+        if bucket.take(now):
+            return 0
+        return bucket.delay(now)
+
+    def refresh(self, entry, methods=None):
+        """ Refreshes and stores the data of entry (all methods by default)
+
+        Data still being computed by the vendor (see vendors.utils.Pending)
+        isn't stored, the previously cached one is kept. Returns the methods
+        whose data is still being computed.
+        """
+
+        repository = Repository(url=entry['url'],
+                                vendor=entry['vendor'],
+                                settings=self.settings,
+                                debug=self.debug,
+                                compact=True)
+        cached = load(self.directory, entry['url'])
+        data = cached['data'] if cached is not None else {}
+        pending = []
+        for method in methods or self.methods:
+            ret = getattr(repository, method)()
+            if is_pending(ret):
+                pending.append(method)
+            else:
+                data[method] = ret
+        store(self.directory, entry['url'], entry['vendor'], data)
+        return pending
+
+    def _run_job(self, entry, methods=None):
+        try:
+            pending = self.refresh(entry, methods)
+        except Exception:
+            logger.exception("Failed to refresh %s", entry['url'])
+            self._done.put((entry, 'failed', None))
+        else:
+            if pending:
+                logger.info("Data of %s is still being computed: %s",
+                            entry['url'], ', '.join(pending))
+                self._done.put((entry, 'pending', pending))
+            else:
+                logger.info("Refreshed %s", entry['url'])
+                self._done.put((entry, 'refreshed', None))
+
+    def _collect(self, timeout, once):
+        # Waits for a finished refresh and reschedules it
+        try:
+            entry, state, pending = self._done.get(timeout=timeout)
+        except queue.Empty:
+            return
+        url = entry['url']
+        self._running[self._host(entry)] -= 1
+
+        if state == 'failed':
+            self._failures[url] = self._failures.get(url, 0) + 1
+            if once:
+                self._pending.pop(url, None)
+                return
+            delay = self.retry_interval(entry)
+        elif state == 'pending':
+            # Not a failure, the vendor will have the data shortly: only
+            # the pending methods are retried, a limited number of times
+            self._failures.pop(url, None)
+            _, tries = self._pending.get(url, (None, 0))
+            if tries < self.pending_tries:
+                self._pending[url] = (pending, tries + 1)
+                delay = self.retry_delay
+            else:
+                logger.warning("Giving up on the data of %s still being computed: %s",
+                               url, ', '.join(pending))
+                self._pending.pop(url, None)
+                if once:
+                    return
+                delay = self.interval(entry)
+        else:
+            self._failures.pop(url, None)
+            self._pending.pop(url, None)
+            if once:
+                return
+            delay = self.interval(entry)
+        self._push(time.time() + delay, entry)
+
+    def run(self, once=False):
+        """ Refreshes the catalog until stop() is called or interrupted
+
+        With once, returns when every repository was refreshed once (data
+        still being computed is retried up to pending_tries times).
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._schedule_initial(once)
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while not self._stop.is_set():
+                if once and not self._heap and not any(self._running.values()):
+                    break
+
+                now = time.time()
+                deferred = []
+                while self._heap and self._heap[0][0] <= now:
+                    if sum(self._running.values()) >= self.workers:
+                        break
+                    item = heapq.heappop(self._heap)
+                    entry = item[3]
+                    host = self._host(entry)
+                    if self._running.get(host, 0) >= self.per_host:
+                        deferred.append(item)
+                        continue
+                    wait = self._throttle(entry, now)
+                    if wait:
+                        logger.debug("Rate limit margin reached for %s", host)
+                        deferred.append((now + wait,) + item[1:])
+                        continue
+                    self._running[host] = self._running.get(host, 0) + 1
+                    methods, _ = self._pending.get(entry['url'], (None, 0))
+                    executor.submit(self._run_job, entry, methods)
+
+                for item in deferred:
+                    heapq.heappush(self._heap, item)
+
+                # Sleeping until the next due refresh or a finished one
+                if self._heap and self._heap[0][0] > now:
+                    timeout = min(self._heap[0][0] - now, 60)
+                else:
+                    timeout = 1
+                self._collect(timeout, once)
+        except KeyboardInterrupt:
+            logger.info("Interrupted, waiting for the running refreshes")
+        finally:
+            self._stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self):
+        self._stop.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m repository.refresh',
+                                     description='Keeps repositories data warm in a cache directory')
+    parser.add_argument('catalog', help='JSON list of {"url", "vendor", "popularity"}')
+    parser.add_argument('--settings', required=True, help='JSON repository settings')
+    parser.add_argument('--output', required=True, help='Cache directory')
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--per-host', type=int, default=2,
+                        help='Concurrent refreshes per host')
+    parser.add_argument('--margin', type=float, default=0.2,
+                        help='Part of the rate limit left unused')
+    parser.add_argument('--min-interval', type=int, default=600,
+                        help='Seconds between refreshes of the most popular repositories')
+    parser.add_argument('--max-interval', type=int, default=86400,
+                        help='Seconds between refreshes of unpopular repositories')
+    parser.add_argument('--host-budget', type=int, default=600,
+                        help='Refreshes per hour per host when the host quota is unknown')
+    parser.add_argument('--pending-tries', type=int, default=5,
+                        help='Retries of data still being computed by the host')
+    parser.add_argument('--once', action='store_true',
+                        help='Refresh every repository once and exit')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    with open(args.catalog) as f:
+        catalog = json.load(f)
+    with open(args.settings) as f:
+        settings = json.load(f)
+
+    refresher = Refresher(catalog, settings, args.output,
+                          methods=args.methods,
+                          workers=args.workers,
+                          per_host=args.per_host,
+                          margin=args.margin,
+                          min_interval=args.min_interval,
+                          max_interval=args.max_interval,
+                          host_budget=args.host_budget,
+                          pending_tries=args.pending_tries,
+                          debug=args.debug)
+    signal.signal(signal.SIGTERM, lambda signum, frame: refresher.stop())
+    refresher.run(once=args.once)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,12 @@
 from .vendors import gitlab, github
+import hashlib
+import json
+from .singleflight import SingleFlight
+from .vendors.models import to_builtin
+
+
+# Concurrent reads of the same repository share a single API fetch and render
+_flight = SingleFlight()
 
 
 class Repository:
@@ -7,6 +15,8 @@ class Repository:
     vendor = None
     vendor_client = None
     vendor_instance = None
+    settings_key = None
+    compact = False
     debug = False
 
     # Supported vendors
@@ -15,11 +25,21 @@ class Repository:
         ('github', github.GithubRepository)
     ]
 
-    def __init__(self, url, vendor, settings={}, debug=False):
+    def __init__(self, url, vendor, settings={}, debug=False, compact=False):
 
         self.url = url
         self.vendor = vendor
         self.debug = debug
+        # Returns the vendors records (see vendors.models) instead of
+        # copying them to dicts. Callers that only read or json.dumps()
+        # the results (with default=json_default) should use it.
+        self.compact = compact
+
+        # Instances with different settings (tokens, limits...) must not
+        # share their results, see get_readme()
+        self.settings_key = hashlib.sha1(
+            json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
 
         for (v, i) in self.vendors:
             if v == self.vendor:
@@ -39,33 +59,52 @@ class Repository:
         # Vendor instance to act on the host
         return self.vendor_instance.get_host_instance()
 
+    def _result(self, result):
+        return result if self.compact else to_builtin(result)
+
+    def _flight_key(self, method):
+        return (self.vendor, self.url, self.settings_key, method)
+
     def get_readme(self):
-        return self.vendor_instance.get_readme()
+        return _flight.do(self._flight_key('get_readme'),
+                          self.vendor_instance.get_readme)
+
+    async def get_readme_async(self):
+        return await _flight.do_async(self._flight_key('get_readme'),
+                                      self.vendor_instance.get_readme)
 
     def get_summary(self):
-        return self.vendor_instance.get_summary()
+        return self._result(_flight.do(self._flight_key('get_summary'),
+                                       self.vendor_instance.get_summary))
+
+    async def get_summary_async(self):
+        return self._result(await _flight.do_async(self._flight_key('get_summary'),
+                                                   self.vendor_instance.get_summary))
 
     def get_latest_commits(self):
-        return self.vendor_instance.get_latest_commits()
+        return self._result(self.vendor_instance.get_latest_commits())
 
     def get_latest_tags(self):
-        return self.vendor_instance.get_latest_tags()
+        return self._result(self.vendor_instance.get_latest_tags())
 
     def get_archive_url(self, **kwargs):
         return self.vendor_instance.get_archive_url(**kwargs)
 
     def get_commits_contributors(self):
-        return self.vendor_instance.get_commits_contributors()
+        return self._result(self.vendor_instance.get_commits_contributors())
 
     def get_issues_contributors(self):
-        return self.vendor_instance.get_issues_contributors()
+        return self._result(self.vendor_instance.get_issues_contributors())
 
     def get_members(self):
-        return self.vendor_instance.get_members()
+        return self._result(self.vendor_instance.get_members())
 
     def get_languages(self):
         return self.vendor_instance.get_languages()
 
+    def get_languages_bytes(self):
+        return self.vendor_instance.get_languages_bytes()
+
     def get_edit_url(self, path):
         return self.vendor_instance.get_edit_url(path)
 
@@ -0,0 +1,91 @@
+import asyncio
+import copy
+import threading
+
+
+def _copy_error(error):
+    # Each waiter raises its own exception, of the same type as the original
+    # one (its cause), so that tracebacks of different threads don't mix
+    try:
+        copied = copy.copy(error)
+    except Exception:
+        return error
+    copied.__cause__ = error
+    return copied
+
+
+class _Call:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """ Deduplicates concurrent calls sharing the same key
+
+    The first caller runs the function, the others wait for it and get a
+    deep copy of its result, or a copy of its exception (caused by the
+    original one). Nothing is cached once the call is done.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise _copy_error(call.error)
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
+
+    async def do_async(self, key, func, *args, **kwargs):
+        # Runs the (blocking) function in the loop executor, through do()
+        # so that threads and coroutines share the same in-flight call.
+        # Coroutines of a loop wait on a single task to save executor threads.
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+
+        with self._lock:
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                task = loop.run_in_executor(
+                    None, lambda: self.do(key, func, *args, **kwargs))
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda _: self._forget(task_key))
+
+        # Shielded so that a cancelled caller doesn't cancel the others
+        try:
+            result = await asyncio.shield(task)
+        except Exception as e:
+            if leader:
+                raise
+            raise _copy_error(e)
+
+        return result if leader else copy.deepcopy(result)
+
+    def _forget(self, task_key):
+        with self._lock:
+            self._tasks.pop(task_key, None)
@@ -1,8 +1,30 @@
-from .utils import VendorInterface, VendorMixin
+from .utils import VendorInterface, VendorMixin, Pending, decode_bounded
+from .models import Commit, Tag, Contributor
+from .tokens import get_token_pool, failover, NoTokenAvailable
 from github import Github
-from urllib.parse import urlparse, urljoin
+from github.StatsContributor import StatsContributor
+from github.GithubException import (
+    BadCredentialsException,
+    RateLimitExceededException,
+    UnknownObjectException,
+)
+from urllib.parse import urlparse, urljoin, quote
+from collections import OrderedDict
 import pydash as dsh
-import base64
+import copy
+import requests
+import threading
+import time
+
+
+# Contributors stats are computed asynchronously by Github: the first calls
+# get a 202 until the stats are ready.
+# Results are cached per namespace as (timestamp, contributors, ttl), least
+# recently used first, and the pending ones are polled in a background thread
+# so callers never wait for them.
+_stats_cache = OrderedDict()
+_stats_polling = set()
+_stats_lock = threading.Lock()
 
 
 class GithubRepository(VendorInterface, VendorMixin):
@@ -13,6 +35,8 @@ class GithubRepository(VendorInterface, VendorMixin):
     host_instance = None
     repository_instance = None
     settings = None
+    token = None
+    token_pool = None
 
     def __init__(self, url, settings={}, **kwargs):
 
@@ -30,8 +54,73 @@ class GithubRepository(VendorInterface, VendorMixin):
         self.host = parsed_url.scheme + '://' + parsed_url.netloc
         self.namespace = parsed_url.path[1:]  # Stripping the first slash
 
-        self.host_instance = Github(self.settings['API_TOKEN'])
-        self.repository_instance = self.host_instance.get_repo(self.namespace)
+        self.token_pool = get_token_pool('github', self.host, self.settings)
+        self._connect()
+
+    def _connect(self):
+        # Tries the pool tokens until one can see the repository
+        tried = []
+        error = None
+        # A namespace no token could see lately is probed with a single token
+        missing = self.token_pool.is_missing(self.namespace)
+        while True:
+            try:
+                token = self.token_pool.acquire(self.namespace, exclude=tried)
+            except NoTokenAvailable:
+                # Surfacing the vendor error rather than the pool one
+                if error is None:
+                    raise
+                if isinstance(error, UnknownObjectException):
+                    self.token_pool.mark_missing(self.namespace)
+                raise error
+            tried.append(token)
+            host_instance = Github(token)
+            try:
+                repository_instance = host_instance.get_repo(self.namespace)
+            except BadCredentialsException as e:
+                self.token_pool.revoke(token)
+                error = e
+                continue
+            except RateLimitExceededException as e:
+                self.token_pool.exhaust(token, host_instance.rate_limiting_resettime)
+                error = e
+                continue
+            except UnknownObjectException as e:
+                if missing:
+                    raise
+                # Private repositories are 404 for tokens without access
+                self.token_pool.deny(token, self.namespace)
+                error = e
+                continue
+            break
+
+        self.token = token
+        self.host_instance = host_instance
+        self.repository_instance = repository_instance
+        self.token_pool.allow(token, self.namespace)
+        self._report_quota()
+
+    def _discard_token(self, error):
+        # Called by @failover, True when another token should be tried
+        if isinstance(error, BadCredentialsException):
+            self.token_pool.revoke(self.token)
+            return True
+        if isinstance(error, RateLimitExceededException):
+            # Raw requests (get_readme) tell when to retry
+            reset_at = getattr(error, 'reset_at', None)
+            if reset_at is None:
+                reset_at = self.host_instance.rate_limiting_resettime
+            self.token_pool.exhaust(self.token, reset_at)
+            return True
+        return False
+
+    def _report_quota(self):
+        # Quota headers of the latest request, no extra API call
+        remaining, limit = self.host_instance.rate_limiting
+        self.token_pool.report(self.token,
+                               remaining=remaining,
+                               limit=limit,
+                               reset_at=self.host_instance.rate_limiting_resettime)
 
     def _get_user(self, username=None):
         return self.host_instance.get_user(username)
@@ -47,14 +136,40 @@ class GithubRepository(VendorInterface, VendorMixin):
     def get_repository_instance(self):
         return self.repository_instance
 
+    @failover
     def get_readme(self):
         repository = self.repository_instance
 
+        truncated = set()
+        token_errors = []
+
         def find_func(path):
-            f = repository.get_contents(path, ref=repository.default_branch)
-            f = f.content
-            f = base64.standard_b64decode(f)
-            return f.decode('utf-8')
+            if token_errors:
+                raise token_errors[0]
+            # Raw media type: no base64 JSON payload and no 1 MB limit
+            url = '{}/contents/{}'.format(repository.url, quote(path))
+            headers = {'Accept': 'application/vnd.github.raw'}
+            if self.token is not None:
+                headers['Authorization'] = 'token {}'.format(self.token)
+            with requests.get(url,
+                              params={'ref': repository.default_branch},
+                              headers=headers,
+                              stream=True,
+                              timeout=self.settings.get('README_TIMEOUT', 15)) as r:
+                # Bypassing PyGithub, the pool needs the quota left
+                self.token_pool.report_headers(self.token, r.headers)
+                error = self._raw_token_error(r)
+                if error is not None:
+                    token_errors.append(error)
+                    raise error
+                r.raise_for_status()
+                content, is_truncated = decode_bounded(
+                    r.iter_content(chunk_size=self.readme_chunk_size),
+                    self._readme_max_size(),
+                )
+            if is_truncated:
+                truncated.add(path)
+            return content
 
         # Finds readme and returns HTML
         path, html_content = super()._find_readme(
@@ -62,6 +177,11 @@ class GithubRepository(VendorInterface, VendorMixin):
                 readme_tests=self.settings['README_TESTS']
         )
 
+        # _find_readme() skips the failing paths, @failover retries
+        # with another token
+        if token_errors:
+            raise token_errors[0]
+
         # Replace relative links by absolute links in HTML
         html_content = self._rel_to_abs_links(
             html_content,
@@ -73,8 +193,38 @@ class GithubRepository(VendorInterface, VendorMixin):
             default_branch=repository.default_branch
         )
 
+        if path in truncated:
+            html_content += self._truncated_readme_note(
+                path,
+                default_branch=repository.default_branch
+            )
+
         return (path, html_content)
 
+    def _raw_token_error(self, response):
+        # Maps the token errors of a raw API response to the PyGithub
+        # exceptions, as PyGithub does for its own requests
+        status = response.status_code
+        headers = dict(response.headers)
+        if status == 401:
+            return BadCredentialsException(status, None, headers)
+        if status not in (403, 429):
+            return None
+
+        # 403 is also returned for forbidden resources, only the primary
+        # (no quota left) and secondary (Retry-After, message) rate limits
+        # are the token's fault
+        retry_after = headers.get('Retry-After')
+        if (status == 429 or headers.get('X-RateLimit-Remaining') == '0'
+                or retry_after is not None or 'rate limit' in response.text.lower()):
+            error = RateLimitExceededException(status, None, headers)
+            if retry_after is not None and retry_after.isdigit():
+                error.reset_at = time.time() + int(retry_after)
+            elif headers.get('X-RateLimit-Reset', '').isdigit():
+                error.reset_at = int(headers['X-RateLimit-Reset'])
+            return error
+        return None
+
     def get_summary(self):
 
         summary = {
@@ -84,6 +234,7 @@ class GithubRepository(VendorInterface, VendorMixin):
 
         return summary
 
+    @failover
     def get_latest_commits(self):
 
         latest_commits = []
@@ -98,13 +249,14 @@ class GithubRepository(VendorInterface, VendorMixin):
         # TODO: add a limit!
         for commit in commits[:limit]:
             c = commit.commit
-            tmp = {}
-            tmp['title'] = c.message
-            tmp['created_at'] = c.author.date
-            tmp['url'] = c.html_url
-            latest_commits.append(tmp)
+            latest_commits.append(Commit(
+                title=c.message,
+                created_at=c.author.date,
+                url=c.html_url,
+            ))
         return latest_commits
 
+    @failover
     def get_latest_tags(self):
 
         latest_tags = []
@@ -120,12 +272,12 @@ class GithubRepository(VendorInterface, VendorMixin):
             tag_rel_url = self.settings['GITHUB_URL_TAG'].format(namespace=self.namespace,
                                                                  name=tag.name)
             tag_abs_url = '{0}{1}'.format(self.settings['GITHUB_URL'], tag_rel_url)
-            tmp = {}
-            tmp['name'] = tag.name
-            tmp['created_at'] = tag.commit.commit.author.date  # Because tag.commit.author returns a NamedUser
-                                                               # whereas tag.commit.commit.author returns a GitAuthor
-            tmp['url'] = tag_abs_url if not self.private else None
-            latest_tags.append(tmp)
+            latest_tags.append(Tag(
+                name=tag.name,
+                created_at=tag.commit.commit.author.date,  # Because tag.commit.author returns a NamedUser
+                                                           # whereas tag.commit.commit.author returns a GitAuthor
+                url=tag_abs_url if not self.private else None,
+            ))
         return latest_tags
 
     def get_archive_url(self, extension='zip', ref=None):
@@ -137,10 +289,109 @@ class GithubRepository(VendorInterface, VendorMixin):
         url = '{}{}'.format(self.settings['GITHUB_URL'], path)
         return url
 
+    @failover
     def get_commits_contributors(self):
 
-        repo = self.host_instance.get_repo(self.namespace)
-        contributors = repo.get_stats_contributors()
+        # Settings are optional, defaults keep page renders non-blocking
+        non_blocking = self.settings.get('STATS_NON_BLOCKING', True)
+
+        with _stats_lock:
+            cached = _stats_cache.get(self.namespace)
+            if cached is not None:
+                _stats_cache.move_to_end(self.namespace)
+
+        if cached is not None:
+            fetched_at, ret, ttl = cached
+            if time.time() - fetched_at > ttl:
+                # Serve the stale result while refreshing it
+                self._schedule_stats_poll()
+            return ret
+
+        if not non_blocking:
+            return self._poll_stats_contributors()
+
+        contributors = self._fetch_stats_contributors()
+        if contributors is None:
+            # Stats are being computed: return a pending result right away
+            # and fill the cache when they are ready
+            self._schedule_stats_poll()
+            return Pending()
+
+        return self._cache_stats_contributors(contributors)
+
+    def _fetch_stats_contributors(self):
+        # Returns None while Github computes the stats.
+        # PyGithub's get_stats_contributors() returns None for both a 202
+        # (stats being computed, '{}' body) and a 204 (no commits, no body).
+        repository = self.repository_instance
+        headers, data = repository._requester.requestJsonAndCheck(
+            "GET", "{}/stats/contributors".format(repository.url)
+        )
+        if isinstance(data, dict):
+            return None
+        return [
+            StatsContributor(repository._requester, headers, attributes, completed=True)
+            for attributes in data or []
+        ]
+
+    def _schedule_stats_poll(self):
+        with _stats_lock:
+            if self.namespace in _stats_polling:
+                return
+            _stats_polling.add(self.namespace)
+
+        thread = threading.Thread(target=self._poll_stats_contributors_thread,
+                                  name='stats-{}'.format(self.namespace),
+                                  daemon=True)
+        thread.start()
+
+    def _poll_stats_contributors_thread(self):
+        try:
+            # Own PyGithub objects (and token failover) for the poll,
+            # the instance is still used by the request thread
+            poller = copy.copy(self)
+            poller._connect()
+            poller._poll_stats_contributors()
+        except Exception:
+            # Never let a background poll crash, next call will retry
+            pass
+        finally:
+            with _stats_lock:
+                _stats_polling.discard(self.namespace)
+
+    @failover
+    def _poll_stats_contributors(self):
+        delay = self.settings.get('STATS_POLL_DELAY', 1)
+        max_delay = self.settings.get('STATS_POLL_MAX_DELAY', 30)
+        max_tries = self.settings.get('STATS_POLL_MAX_TRIES', 8)
+
+        for _ in range(max_tries):
+            contributors = self._fetch_stats_contributors()
+            if contributors is not None:
+                return self._cache_stats_contributors(contributors)
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+        # Still not computed: cached for a while so that page views don't
+        # start new polls in a row
+        ret = Pending()
+        self._cache_stats(ret, self.settings.get('STATS_PENDING_TTL', 300))
+        return ret
+
+    def _cache_stats_contributors(self, contributors):
+        ret = self._format_stats_contributors(contributors)
+        self._cache_stats(ret, self.settings.get('STATS_CACHE_TTL', 3600))
+        return ret
+
+    def _cache_stats(self, ret, ttl):
+        max_size = self.settings.get('STATS_CACHE_SIZE', 1024)
+        with _stats_lock:
+            _stats_cache[self.namespace] = (time.time(), ret, ttl)
+            _stats_cache.move_to_end(self.namespace)
+            while len(_stats_cache) > max_size:
+                _stats_cache.popitem(last=False)
+
+    def _format_stats_contributors(self, contributors):
 
         # Example response:
         # [{'name': 'Raphaël Voyazopoulos', 'email': "
@@ -154,19 +405,20 @@ class GithubRepository(VendorInterface, VendorMixin):
         ret = []
 
         for contributor in contributors:
-            tmp = {}
-            tmp['display_name'] = self._get_user_name(username=contributor.author.login)
+            ret.append(Contributor(
+                display_name=self._get_user_name(username=contributor.author.login),
 
-            # Email is not directly disclosed, have to get it by another API call
-            tmp['email'] = self._get_user(username=contributor.author.login).email
+                # Email is not directly disclosed, have to get it by another API call
+                email=self._get_user(username=contributor.author.login).email,
 
-            tmp['extra_data'] = {
-                'commits': contributor.total,
-            }
-            ret.append(tmp)
+                extra_data={
+                    'commits': contributor.total,
+                },
+            ))
 
         return ret
 
+    @failover
     def get_issues_contributors(self):
 
         # NOTE: only counting issues authors
@@ -197,11 +449,11 @@ class GithubRepository(VendorInterface, VendorMixin):
 
         for contributor in contributors:
             github_user = self._get_user(username=contributor.login)
-            tmp = {}
-            tmp['email'] = github_user.email
-            tmp['display_name'] = self._get_user_name(username=github_user.login)
-            tmp['extra_data'] = {}
-            ret.append(tmp)
+            ret.append(Contributor(
+                email=github_user.email,
+                display_name=self._get_user_name(username=github_user.login),
+                extra_data={},
+            ))
 
         return ret
 
@@ -211,11 +463,17 @@ class GithubRepository(VendorInterface, VendorMixin):
         # repo.get_collaborators()
         return []
 
-    def get_languages(self):
+    @failover
+    def get_languages_bytes(self):
 
         repo = self.repository_instance
-        languages = repo.get_languages()  # Returns {lang: bytes}
-                                          # and not {lang: %} like GitLab
+        return repo.get_languages()  # Returns {lang: bytes}
+                                     # and not {lang: %} like GitLab
+
+    @failover
+    def get_languages(self):
+
+        languages = self.get_languages_bytes()
 
         # Returning % instead of bytes for each languages
         total = dsh.collections.reduce_(languages, lambda m, v, k: v + m, 0)
@@ -1,4 +1,6 @@
-from .utils import VendorInterface, VendorMixin
+from .utils import VendorInterface, VendorMixin, decode_bounded
+from .models import Commit, Tag, Contributor, Member
+from .tokens import get_token_pool, failover, NoTokenAvailable
 import gitlab
 from urllib.parse import urlparse, urljoin, quote
 import pydash as dsh
@@ -12,6 +14,8 @@ class GitlabRepository(VendorInterface, VendorMixin):
     host_instance = None
     repository_instance = None
     settings = None
+    token = None
+    token_pool = None
 
     def __init__(self, url, settings={}, **kwargs):
 
@@ -29,10 +33,61 @@ class GitlabRepository(VendorInterface, VendorMixin):
         self.host = parsed_url.scheme + '://' + parsed_url.netloc
         self.namespace = parsed_url.path[1:]  # Stripping the first slash
 
-        self.host_instance = gitlab.Gitlab(self.host, private_token=self.settings['API_TOKEN'])
-        self.repository_instance = self.host_instance.projects.get(self.namespace)
+        self.token_pool = get_token_pool('gitlab', self.host, self.settings)
+        self._connect()
         # TODO: test if host is indeed a Gitlab server
 
+    def _connect(self):
+        # Tries the pool tokens until one can see the project
+        # NOTE: Gitlab doesn't give us the remaining quota, tokens are used
+        #       in turns and python-gitlab waits on 429 by itself
+        tried = []
+        error = None
+        # A namespace no token could see lately is probed with a single token
+        missing = self.token_pool.is_missing(self.namespace)
+        while True:
+            try:
+                token = self.token_pool.acquire(self.namespace, exclude=tried)
+            except NoTokenAvailable:
+                # Surfacing the vendor error rather than the pool one
+                if error is None:
+                    raise
+                if isinstance(error, gitlab.exceptions.GitlabGetError):
+                    self.token_pool.mark_missing(self.namespace)
+                raise error
+            tried.append(token)
+            host_instance = gitlab.Gitlab(self.host, private_token=token)
+            try:
+                repository_instance = host_instance.projects.get(self.namespace)
+            except gitlab.exceptions.GitlabAuthenticationError as e:
+                self.token_pool.revoke(token)
+                error = e
+                continue
+            except gitlab.exceptions.GitlabGetError as e:
+                if e.response_code not in (403, 404) or missing:
+                    raise
+                # Private projects are 404 for tokens without access
+                self.token_pool.deny(token, self.namespace)
+                error = e
+                continue
+            break
+
+        self.token = token
+        self.host_instance = host_instance
+        self.repository_instance = repository_instance
+        self.token_pool.allow(token, self.namespace)
+
+    def _discard_token(self, error):
+        # Called by @failover, True when another token should be tried
+        if isinstance(error, gitlab.exceptions.GitlabAuthenticationError):
+            self.token_pool.revoke(self.token)
+            return True
+        return False
+
+    def _report_quota(self):
+        # Not exposed by python-gitlab
+        pass
+
     def _get_user(self, username=None):
         # Gets the Gitlab user tied to a username.
         # Used mostly to get the email.
@@ -46,23 +101,53 @@ class GitlabRepository(VendorInterface, VendorMixin):
     def get_repository_instance(self):
         return self.repository_instance
 
+    @failover
     def get_readme(self):
 
         project = self.repository_instance
         branch = self.repository_instance.default_branch
 
+        truncated = set()
+        token_errors = []
+
         def find_func(path):
-            f = project.files.get(
-                file_path=path,
-                ref=branch,
-            )
-            return f.decode().decode("utf-8")
+            if token_errors:
+                raise token_errors[0]
+            # Raw file endpoint: no base64 JSON payload, streamed by chunks
+            # (same path encoding as project.files.raw())
+            file_path = path.replace('/', '%2F').replace('.', '%2E')
+            try:
+                r = self.host_instance.http_get(
+                    '{}/{}/raw'.format(project.files.path, file_path),
+                    query_data={'ref': branch},
+                    streamed=True,
+                )
+            except gitlab.exceptions.GitlabAuthenticationError as e:
+                token_errors.append(e)
+                raise
+            # Gitlab.com sends rate limit headers, self-hosted ones may not
+            self.token_pool.report_headers(self.token, r.headers, prefix='RateLimit-')
+            try:
+                content, is_truncated = decode_bounded(
+                    r.iter_content(chunk_size=self.readme_chunk_size),
+                    self._readme_max_size(),
+                )
+            finally:
+                r.close()
+            if is_truncated:
+                truncated.add(path)
+            return content
 
         path, html_content = super()._find_readme(
             find_func,
             readme_tests=self.settings['README_TESTS'],
         )
 
+        # _find_readme() skips the failing paths, @failover retries
+        # with another token
+        if token_errors:
+            raise token_errors[0]
+
         # Replace relative links by absolute links in HTML
         html_content = self._rel_to_abs_links(
             html_content,
@@ -74,6 +159,12 @@ class GitlabRepository(VendorInterface, VendorMixin):
             default_branch=branch,
         )
 
+        if path in truncated:
+            html_content += self._truncated_readme_note(
+                path,
+                default_branch=branch,
+            )
+
         return (path, html_content)
 
     def get_summary(self):
@@ -84,6 +175,7 @@ class GitlabRepository(VendorInterface, VendorMixin):
         }
         return summary
 
+    @failover
     def get_latest_commits(self):
         latest_commits = []
         project = self.repository_instance
@@ -99,13 +191,14 @@ class GitlabRepository(VendorInterface, VendorMixin):
             commit_rel_url = self.settings['GITLAB_URL_COMMIT'].format(namespace=self.namespace,
                                                                sha=c['id'])
             commit_abs_url = '{0}{1}'.format(self.host, commit_rel_url)
-            tmp = {}
-            tmp['title'] = c['title']
-            tmp['created_at'] = c['created_at']  # There's also committed_at and authored_at, not sure which one to choose
-            tmp['url'] = commit_abs_url
-            latest_commits.append(tmp)
+            latest_commits.append(Commit(
+                title=c['title'],
+                created_at=c['created_at'],  # There's also committed_at and authored_at, not sure which one to choose
+                url=commit_abs_url,
+            ))
         return latest_commits
 
+    @failover
     def get_latest_tags(self):
         latest_tags = []
         project = self.repository_instance
@@ -121,11 +214,11 @@ class GitlabRepository(VendorInterface, VendorMixin):
             tag_rel_url = self.settings['GITLAB_URL_TAG'].format(namespace=self.namespace,
                                                          name=t['name'])
             tag_abs_url = '{0}{1}'.format(self.host, tag_rel_url)
-            tmp = {}
-            tmp['name'] = t['name']
-            tmp['created_at'] = t['commit']['created_at']  # A tag is tied to a commit
-            tmp['url'] = tag_abs_url if not self.private else None
-            latest_tags.append(tmp)
+            latest_tags.append(Tag(
+                name=t['name'],
+                created_at=t['commit']['created_at'],  # A tag is tied to a commit
+                url=tag_abs_url if not self.private else None,
+            ))
         return latest_tags
 
     def get_archive_url(self, extension='zip', ref=None):
@@ -138,6 +231,7 @@ class GitlabRepository(VendorInterface, VendorMixin):
         url = '{}{}'.format(self.host, path)
         return url
 
+    @failover
     def get_commits_contributors(self):
 
         project = self.repository_instance
@@ -155,18 +249,19 @@ class GitlabRepository(VendorInterface, VendorMixin):
         ret = []
 
         for contributor in contributors:
-            tmp = {}
-            tmp['display_name'] = contributor['name']
-            tmp['email'] = contributor['email']
-            tmp['extra_data'] = {
-                'commits': contributor['commits'],
-                'additions': contributor['additions'],
-                'deletions': contributor['deletions'],
-            }
-            ret.append(tmp)
+            ret.append(Contributor(
+                display_name=contributor['name'],
+                email=contributor['email'],
+                extra_data={
+                    'commits': contributor['commits'],
+                    'additions': contributor['additions'],
+                    'deletions': contributor['deletions'],
+                },
+            ))
 
         return ret
 
+    @failover
     def get_issues_contributors(self):
 
         # NOTE: only counting issues authors
@@ -197,14 +292,15 @@ class GitlabRepository(VendorInterface, VendorMixin):
 
         for contributor in contributors:
             gitlab_user = self._get_user(username=contributor['username'])
-            tmp = {}
-            tmp['email'] = gitlab_user.email
-            tmp['display_name'] = gitlab_user.name
-            tmp['extra_data'] = {}
-            ret.append(tmp)
+            ret.append(Contributor(
+                email=gitlab_user.email,
+                display_name=gitlab_user.name,
+                extra_data={},
+            ))
 
         return ret
 
+    @failover
     def get_members(self):
 
         project = self.repository_instance
@@ -224,16 +320,21 @@ class GitlabRepository(VendorInterface, VendorMixin):
 
         for contributor in contributors:
             gitlab_user = self._get_user(username=contributor.username)
-            tmp = {}
-            tmp['email'] = gitlab_user.email
-            tmp['display_name'] = gitlab_user.name
-            tmp['extra_data'] = {
-                "access_level": contributor.access_level
-            }
-            ret.append(tmp)
+            ret.append(Member(
+                email=gitlab_user.email,
+                display_name=gitlab_user.name,
+                extra_data={
+                    "access_level": contributor.access_level
+                },
+            ))
 
         return ret
 
+    def get_languages_bytes(self):
+        # Gitlab only gives {lang: %}, bytes are not available
+        return None
+
+    @failover
     def get_languages(self):
 
         project = self.repository_instance
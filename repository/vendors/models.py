@@ -0,0 +1,106 @@
+from collections.abc import Mapping
+from datetime import date
+
+
+class Record(Mapping):
+    """ Compact result record with a dict-like view
+
+    Fields are __slots__ so no per-item dict is kept in memory, while
+    record['field'], .get(), .items() and dict(record) keep working.
+    Repository returns them as plain dicts unless built with compact=True,
+    see to_builtin().
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, *args, **kwargs):
+        fields = self._fields
+        if len(args) > len(fields):
+            raise TypeError("{} takes at most {} values".format(type(self).__name__, len(fields)))
+        for field, value in zip(fields, args):
+            setattr(self, field, value)
+        for field in fields[len(args):]:
+            setattr(self, field, kwargs.pop(field, None))
+        if kwargs:
+            raise TypeError("{} got unknown or duplicated fields: {}".format(
+                type(self).__name__, ', '.join(kwargs)))
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(field, getattr(self, field)) for field in self._fields))
+
+    def __reduce__(self):
+        # Pickled as a plain tuple of values
+        return (type(self), self.to_tuple())
+
+    def to_tuple(self):
+        return tuple(getattr(self, field) for field in self._fields)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self._fields}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class Commit(Record):
+    __slots__ = _fields = ('title', 'created_at', 'url')
+
+
+class Tag(Record):
+    __slots__ = _fields = ('name', 'created_at', 'url')
+
+
+class Contributor(Record):
+    __slots__ = _fields = ('display_name', 'email', 'extra_data')
+
+
+class Member(Contributor):
+    # Same fields, extra_data holds the access level
+    __slots__ = ()
+
+
+def json_default(obj):
+    """ json.dumps(..., default=json_default) encodes records as dicts
+    and dates in ISO 8601
+    """
+
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+def to_builtin(result):
+    # Replaces the records of a result by plain dicts, keeping list types
+    # (e.g. vendors.utils.Pending)
+    if isinstance(result, Record):
+        return result.to_dict()
+    if isinstance(result, list):
+        return type(result)(to_builtin(item) for item in result)
+    if isinstance(result, dict):
+        return {key: to_builtin(value) for key, value in result.items()}
+    return result
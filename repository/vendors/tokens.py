@@ -0,0 +1,207 @@
+import functools
+import threading
+import time
+
+
+class NoTokenAvailable(Exception):
+    pass
+
+
+class TokenPool:
+    """ Pool of API tokens shared by every repository of a host
+
+    Tokens are picked by most remaining quota (unknown quotas first so that
+    they get probed), then the ones known to see the namespace, then least
+    recently used. Exhausted tokens are put aside until their reset time,
+    revoked ones for good, and tokens which can't see a namespace (e.g. a
+    private repository) are skipped for it.
+    """
+
+    # Seconds before retrying a token on a namespace it couldn't see
+    deny_ttl = 3600
+    # Seconds a namespace no token could see is probed with a single token
+    missing_ttl = 60
+
+    def __init__(self, tokens=[]):
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._missing = {}
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token):
+        with self._lock:
+            if token in self._tokens:
+                return
+            self._tokens[token] = {
+                'remaining': None,
+                'limit': None,
+                'reset_at': 0,
+                'last_used': 0,
+                'revoked': False,
+                'denied': {},
+                'allowed': set(),
+            }
+
+    def acquire(self, namespace=None, exclude=[]):
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for token, state in self._tokens.items():
+                if token in exclude or state['revoked']:
+                    continue
+                if state['denied'].get(namespace, 0) > now:
+                    continue
+                if state['remaining'] == 0 and state['reset_at'] > now:
+                    continue
+                candidates.append((token, state))
+
+            if not candidates:
+                raise NoTokenAvailable("No API token available for {}".format(namespace))
+
+            def priority(item):
+                token, state = item
+                if state['remaining'] is None or state['reset_at'] <= now:
+                    remaining = float('inf')
+                else:
+                    remaining = state['remaining']
+                # Tokens known to see the namespace break the ties
+                known = namespace in state['allowed']
+                return (remaining, known, -state['last_used'])
+
+            token, state = max(candidates, key=priority)
+            state['last_used'] = now
+            return token
+
+    def report(self, token, remaining=None, limit=None, reset_at=None):
+        # Records the quota left for a token, as given by the vendor
+        with self._lock:
+            state = self._tokens[token]
+            if (remaining is not None and state['remaining'] is not None
+                    and reset_at == state['reset_at']):
+                # Same window: older headers can't give more quota back
+                remaining = min(remaining, state['remaining'])
+            if remaining is not None:
+                state['remaining'] = remaining
+            if limit is not None:
+                state['limit'] = limit
+            if reset_at is not None:
+                state['reset_at'] = reset_at
+
+    def report_headers(self, token, headers, prefix='X-RateLimit-'):
+        # Records the quota given by the rate limit headers of a response
+        try:
+            remaining = int(headers[prefix + 'Remaining'])
+            limit = int(headers[prefix + 'Limit'])
+            reset_at = int(headers[prefix + 'Reset'])
+        except (KeyError, ValueError):
+            return
+        self.report(token, remaining=remaining, limit=limit, reset_at=reset_at)
+
+    def exhaust(self, token, reset_at=None):
+        if reset_at is None:
+            reset_at = time.time() + 60
+        self.report(token, remaining=0, reset_at=reset_at)
+
+    def revoke(self, token):
+        with self._lock:
+            self._tokens[token]['revoked'] = True
+
+    def allow(self, token, namespace):
+        with self._lock:
+            self._tokens[token]['allowed'].add(namespace)
+            self._tokens[token]['denied'].pop(namespace, None)
+
+    def deny(self, token, namespace):
+        with self._lock:
+            self._tokens[token]['denied'][namespace] = time.time() + self.deny_ttl
+            self._tokens[token]['allowed'].discard(namespace)
+
+    def mark_missing(self, namespace):
+        # No token could see the namespace: it most likely doesn't exist,
+        # forget the denials so that the vendor error is raised next time
+        with self._lock:
+            self._missing[namespace] = time.time() + self.missing_ttl
+            for state in self._tokens.values():
+                state['denied'].pop(namespace, None)
+
+    def is_missing(self, namespace):
+        with self._lock:
+            return self._missing.get(namespace, 0) > time.time()
+
+    def quota(self):
+        # Total (remaining, limit) of the known, usable tokens
+        now = time.time()
+        remaining = 0
+        limit = 0
+        with self._lock:
+            for state in self._tokens.values():
+                if state['revoked'] or state['limit'] is None:
+                    continue
+                limit += state['limit']
+                if state['reset_at'] <= now:
+                    remaining += state['limit']
+                else:
+                    remaining += state['remaining'] or 0
+        return (remaining, limit)
+
+
+def failover(method):
+    """ Retries a vendor method with another token of the pool
+
+    The vendor tells whether an error is due to the token with
+    _discard_token(error), reconnects with _connect() and reports the quota
+    left after each call with _report_quota().
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        while True:
+            try:
+                ret = method(self, *args, **kwargs)
+            except Exception as e:
+                if not self._discard_token(e):
+                    raise
+                try:
+                    self._connect()
+                except NoTokenAvailable:
+                    raise e
+                continue
+            self._report_quota()
+            return ret
+
+    return wrapper
+
+
+# Pools are shared across instances so that quotas are tracked per host.
+# They are keyed on their tokens too: a repository is only ever accessed with
+# the tokens given in its settings.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_token_pool(vendor, host, settings):
+    """ Returns the token pool of a host given the repository settings
+
+    settings['API_TOKENS'] is either a list of tokens or a dict mapping
+    hosts to lists of tokens. settings['API_TOKEN'] is still supported
+    as a single token pool. Without any token, the pool holds None for
+    anonymous access (public repositories).
+    """
+
+    tokens = settings.get('API_TOKENS', [])
+    if isinstance(tokens, dict):
+        tokens = tokens.get(host, [])
+    tokens = list(tokens)
+    if settings.get('API_TOKEN') and settings['API_TOKEN'] not in tokens:
+        tokens.append(settings['API_TOKEN'])
+    if not tokens:
+        tokens = [None]
+
+    key = (vendor, host, frozenset(tokens))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = TokenPool(tokens)
+
+    return pool
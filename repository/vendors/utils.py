@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+import codecs
+import html
 import markdown
 import re
 import os
@@ -19,6 +21,16 @@ class VendorInterface(ABC):
         pass
 
 
+class Pending(list):
+    """ Empty result returned while the vendor is still computing the data """
+
+    __slots__ = ()
+
+
+def is_pending(result):
+    return isinstance(result, Pending)
+
+
 def is_relative_url(url):
     if len(url) == 0:
         return False
@@ -30,6 +42,39 @@ def is_relative_url(url):
     return not has_netloc and not is_anchor
 
 
+def decode_bounded(chunks, max_size, encoding='utf-8'):
+    """ Decodes a stream of bytes chunks, reading at most max_size bytes
+
+    Returns the text and whether it was truncated.
+    """
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    parts = []
+    size = 0
+    truncated = False
+
+    for chunk in chunks:
+        if size + len(chunk) > max_size:
+            chunk = chunk[:max_size - size]
+            truncated = True
+        size += len(chunk)
+        # A multi-byte character split by the cut is left out
+        parts.append(decoder.decode(chunk, final=False))
+        if truncated:
+            break
+
+    if not truncated:
+        parts.append(decoder.decode(b'', final=True))
+        return (''.join(parts), False)
+
+    # Cutting at the last line break so that markup isn't left half written
+    text = ''.join(parts)
+    last_line = text.rfind('\n')
+    if last_line > 0:
+        text = text[:last_line + 1]
+    return (text, True)
+
+
 class VendorMixin:
 
     default_markdown_extensions = [
@@ -43,6 +88,19 @@ class VendorMixin:
     ]
     default_markdown_extension_configs = {}
 
+    # Bytes of a README read at most, the rest is truncated
+    default_readme_max_size = 1024 * 1024
+    readme_chunk_size = 64 * 1024
+
+    def _readme_max_size(self):
+        return self.settings.get('README_MAX_SIZE', self.default_readme_max_size)
+
+    def _truncated_readme_note(self, path, default_branch="master"):
+        # Appended to the HTML of a README cut at README_MAX_SIZE
+        url = f"{self.host}/{self.namespace}/blob/{default_branch}/{path}"
+        return '<p><em>This README is truncated, <a href="{}">see the full file</a>.</em></p>'.format(
+            html.escape(url))
+
     def _rel_to_abs_links(self, html, default_branch="master"):
         """ Rewrite relative links to absolute links in a HTML string """
 
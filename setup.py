@@ -21,6 +21,7 @@ setup(name='python-repository-interface',
         "docutils==0.14",
         "pydash",
         "bleach==4.1.0",
-        "beautifulsoup4==4.10.0"
+        "beautifulsoup4==4.10.0",
+        "requests"
       ]
 )
@@ -1,6 +1,11 @@
 import pytest
+import time
+from types import SimpleNamespace
 
 from repository.repository import Repository
+from repository.vendors import github
+from repository.vendors.github import GithubRepository
+from repository.vendors.utils import is_pending
 
 @pytest.fixture
 def settings():
@@ -34,3 +39,152 @@ def test_readme(url, settings):
 
 
 
+
+
+class StubStatsRepository:
+    """ Answers the contributors stats requests with the given JSON data """
+
+    url = "https://api.github.com/repos/Ircam-WAM/TimeSide"
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self._requester = self
+
+    def requestJsonAndCheck(self, verb, url):
+        assert url == self.url + "/stats/contributors"
+        self.calls += 1
+        return ({}, self.responses.pop(0))
+
+
+@pytest.fixture
+def stats_repo(monkeypatch):
+    github._stats_cache.clear()
+    github._stats_polling.clear()
+
+    repo = GithubRepository.__new__(GithubRepository)
+    repo.namespace = "Ircam-WAM/TimeSide"
+    repo.settings = {'STATS_POLL_DELAY': 0, 'STATS_POLL_MAX_TRIES': 2}
+    repo.scheduled = 0
+
+    def schedule():
+        repo.scheduled += 1
+
+    monkeypatch.setattr(repo, "_schedule_stats_poll", schedule)
+    monkeypatch.setattr(repo, "_report_quota", lambda: None)
+    monkeypatch.setattr(repo, "_get_user_name", lambda username=None: username)
+    monkeypatch.setattr(repo, "_get_user", lambda username=None: SimpleNamespace(email=None))
+    return repo
+
+
+def stats_contributor(login, total):
+    return {'author': {'login': login}, 'total': total, 'weeks': []}
+
+
+def test_commits_contributors_pending(stats_repo):
+    # 202 while Github computes the stats
+    stats_repo.repository_instance = StubStatsRepository([{}])
+    ret = stats_repo.get_commits_contributors()
+    assert is_pending(ret)
+    assert ret == []
+    assert stats_repo.scheduled == 1
+
+
+def test_commits_contributors_empty(stats_repo):
+    # 204 for a repository without commits
+    stats_repo.repository_instance = StubStatsRepository([None])
+    ret = stats_repo.get_commits_contributors()
+    assert not is_pending(ret)
+    assert ret == []
+    assert stats_repo.get_commits_contributors() == []
+    assert stats_repo.repository_instance.calls == 1
+    assert stats_repo.scheduled == 0
+
+
+def test_commits_contributors_cached(stats_repo):
+    stats_repo.repository_instance = StubStatsRepository([[stats_contributor("johndoe", 2)]])
+    ret = stats_repo.get_commits_contributors()
+    assert not is_pending(ret)
+    assert ret[0]['display_name'] == "johndoe"
+    assert ret[0]['extra_data'] == {'commits': 2}
+
+    # Served from the cache, no API call nor poll
+    assert stats_repo.get_commits_contributors() == ret
+    assert stats_repo.repository_instance.calls == 1
+    assert stats_repo.scheduled == 0
+
+
+def test_commits_contributors_stale(stats_repo):
+    stats_repo.repository_instance = StubStatsRepository([])
+    stale = [{'display_name': "johndoe", 'email': None, 'extra_data': {'commits': 1}}]
+    github._stats_cache[stats_repo.namespace] = (time.time() - 7200, stale, 3600)
+    assert stats_repo.get_commits_contributors() == stale
+    assert stats_repo.scheduled == 1
+
+
+def test_commits_contributors_blocking(stats_repo):
+    stats_repo.settings['STATS_NON_BLOCKING'] = False
+    stats_repo.repository_instance = StubStatsRepository([{}, [stats_contributor("johndoe", 2)]])
+    ret = stats_repo.get_commits_contributors()
+    assert ret[0]['extra_data'] == {'commits': 2}
+    assert stats_repo.repository_instance.calls == 2
+
+
+def test_commits_contributors_never_computed(stats_repo):
+    stats_repo.settings['STATS_NON_BLOCKING'] = False
+    stats_repo.repository_instance = StubStatsRepository([{}, {}])
+    assert is_pending(stats_repo.get_commits_contributors())
+
+    # The pending result is cached, no new poll
+    assert is_pending(stats_repo.get_commits_contributors())
+    assert stats_repo.repository_instance.calls == 2
+    assert stats_repo.scheduled == 0
+
+
+def test_poll_thread_own_instance(stats_repo, monkeypatch):
+    original = StubStatsRepository([])
+    stats_repo.repository_instance = original
+
+    def connect(self):
+        self.repository_instance = StubStatsRepository([[stats_contributor("johndoe", 2)]])
+
+    monkeypatch.setattr(GithubRepository, "_connect", connect)
+    github._stats_polling.add(stats_repo.namespace)
+    stats_repo._poll_stats_contributors_thread()
+
+    assert stats_repo.repository_instance is original
+    assert stats_repo.namespace not in github._stats_polling
+    assert github._stats_cache[stats_repo.namespace][1][0]['display_name'] == "johndoe"
+
+
+class StubResponse:
+
+    def __init__(self, status_code, headers=None, text=""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+@pytest.mark.parametrize("response, exception", [
+    (StubResponse(401), github.BadCredentialsException),
+    (StubResponse(403, {'X-RateLimit-Remaining': '0'}), github.RateLimitExceededException),
+    (StubResponse(403, {'Retry-After': '60'}), github.RateLimitExceededException),
+    (StubResponse(403, text='{"message": "You have exceeded a secondary rate limit"}'),
+     github.RateLimitExceededException),
+    (StubResponse(429), github.RateLimitExceededException),
+    (StubResponse(403, text='{"message": "Resource not accessible"}'), None),
+    (StubResponse(404), None),
+])
+def test_raw_token_error(response, exception):
+    repo = GithubRepository.__new__(GithubRepository)
+    error = repo._raw_token_error(response)
+    if exception is None:
+        assert error is None
+    else:
+        assert isinstance(error, exception)
+
+
+def test_raw_secondary_rate_limit_reset():
+    repo = GithubRepository.__new__(GithubRepository)
+    error = repo._raw_token_error(StubResponse(403, {'Retry-After': '60'}))
+    assert time.time() + 50 < error.reset_at <= time.time() + 60
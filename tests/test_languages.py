@@ -0,0 +1,41 @@
+import pytest
+
+from repository.languages import LanguageMatrix
+
+
+@pytest.fixture
+def matrix():
+    return LanguageMatrix.from_rows([
+        ("https://github.com/Ircam-WAM/TimeSide", {"Python": 300, "C": 100}, True),
+        ("https://gitlab.com/Ircam-WAM/forum", {"Python": 50, "JavaScript": 50}, False),
+        ("https://github.com/johndoe/empty", {}, True),
+    ])
+
+
+def test_from_rows(matrix):
+    assert matrix.languages == ["Python", "C", "JavaScript"]
+    assert list(matrix.indptr) == [0, 2, 4, 4]
+    assert matrix.row("https://gitlab.com/Ircam-WAM/forum") == {"Python": 50, "JavaScript": 50}
+    assert matrix.row("https://github.com/johndoe/empty") == {}
+
+
+def test_totals(matrix):
+    # Percentages rows (Gitlab) are not bytes
+    assert matrix.totals() == {"Python": 300, "C": 100}
+
+
+def test_shares(matrix):
+    assert matrix.shares() == {"Python": 62.5, "C": 12.5, "JavaScript": 25}
+    assert matrix.shares(["https://github.com/johndoe/empty"]) == {}
+
+
+def test_group_by(matrix):
+    owner = lambda url: url.split("/")[3]
+    assert matrix.group_by(owner) == {
+        "Ircam-WAM": {"Python": 62.5, "C": 12.5, "JavaScript": 25},
+        "johndoe": {},
+    }
+    assert matrix.group_by(owner, method="totals") == {
+        "Ircam-WAM": {"Python": 300, "C": 100},
+        "johndoe": {},
+    }
@@ -0,0 +1,76 @@
+import json
+import pickle
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+
+from repository.repository import Repository
+from repository.vendors.gitlab import GitlabRepository
+from repository.vendors.models import Commit, Member, Tag, json_default
+
+
+def test_dict_view():
+    commit = Commit(title="Initial commit", created_at="2020-01-01", url=None)
+    assert commit["title"] == "Initial commit"
+    assert commit.get("foo") is None
+    assert dict(commit) == {"title": "Initial commit", "created_at": "2020-01-01", "url": None}
+    assert not hasattr(commit, "__dict__")
+
+
+def test_unknown_fields():
+    with pytest.raises(TypeError):
+        Commit(titel="Initial commit")
+    with pytest.raises(TypeError):
+        Commit("Initial commit", "2020-01-01", None, "extra")
+    with pytest.raises(TypeError):
+        Commit("Initial commit", title="Initial commit")
+
+
+def test_serialize():
+    member = Member("johndoe", "johndoe@yopmail.com", {"access_level": 40})
+    assert pickle.loads(pickle.dumps(member)) == member
+    assert Member.from_tuple(member.to_tuple()) == member
+    assert json.loads(json.dumps(member, default=json_default)) == member.to_dict()
+
+    tag = Tag("v1.0", datetime(2020, 1, 1), None)
+    assert json.loads(json.dumps(tag, default=json_default))["created_at"] == "2020-01-01T00:00:00"
+
+
+@pytest.fixture
+def gitlab_repository():
+    commits = [SimpleNamespace(attributes={
+        'id': "a1b2c3",
+        'title': "Initial commit",
+        'created_at': "2020-01-01T00:00:00.000Z",
+    })]
+
+    vendor = GitlabRepository.__new__(GitlabRepository)
+    vendor.host = "https://gitlab.com"
+    vendor.namespace = "Ircam-WAM/forum"
+    vendor.settings = {
+        'LATEST_COMMITS_LIMIT': 5,
+        'GITLAB_URL_COMMIT': "/{namespace}/commit/{sha}",
+    }
+    vendor.repository_instance = SimpleNamespace(
+        commits=SimpleNamespace(list=lambda: commits))
+
+    repository = Repository.__new__(Repository)
+    repository.vendor_instance = vendor
+    return repository
+
+
+def test_repository_returns_dicts(gitlab_repository):
+    commits = gitlab_repository.get_latest_commits()
+    assert all(isinstance(commit, dict) for commit in commits)
+    assert json.loads(json.dumps(commits)) == [{
+        'title': "Initial commit",
+        'created_at': "2020-01-01T00:00:00.000Z",
+        'url': "https://gitlab.com/Ircam-WAM/forum/commit/a1b2c3",
+    }]
+
+
+def test_repository_compact(gitlab_repository):
+    gitlab_repository.compact = True
+    commits = gitlab_repository.get_latest_commits()
+    assert isinstance(commits[0], Commit)
+    assert json.loads(json.dumps(commits, default=json_default))[0]['title'] == "Initial commit"
@@ -0,0 +1,140 @@
+import heapq
+import pytest
+import threading
+import time
+
+from repository import refresh
+from repository.refresh import Refresher, TokenBucket, load, store
+from repository.vendors.utils import Pending
+
+
+catalog = [
+    {"url": "https://github.com/Ircam-WAM/TimeSide", "vendor": "github", "popularity": 10},
+    {"url": "https://github.com/Ircam-WAM/forum", "vendor": "github"},
+    {"url": "https://gitlab.com/Ircam-WAM/mezzo", "vendor": "gitlab", "popularity": 3},
+]
+
+
+class StubRefresher(Refresher):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+        self.refreshed = []
+
+    def refresh(self, entry, methods=None):
+        host = self._host(entry)
+        with self.lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.max_running[host] = max(self.max_running.get(host, 0), self.running[host])
+        time.sleep(0.05)
+        with self.lock:
+            self.running[host] -= 1
+            self.refreshed.append(entry['url'])
+        return []
+
+
+def test_interval(tmp_path):
+    refresher = Refresher(catalog, {}, tmp_path, min_interval=600, max_interval=86400)
+    assert refresher.interval({"popularity": 0}) == 86400
+    assert refresher.interval({"popularity": 1}) == 43200
+    assert refresher.interval({"popularity": 1000}) == 600
+
+
+def test_retry_interval(tmp_path):
+    refresher = Refresher(catalog, {}, tmp_path, retry_delay=60)
+    entry = catalog[0]
+    assert refresher.retry_interval(entry) == 60
+    refresher._failures[entry['url']] = 3
+    assert refresher.retry_interval(entry) == 240
+
+
+def test_heap_order(tmp_path):
+    refresher = Refresher(catalog, {}, tmp_path)
+    refresher._schedule_initial(once=True)
+    order = [heapq.heappop(refresher._heap)[3]['url'] for _ in catalog]
+    # Same due time, most popular first
+    assert order == [catalog[0]['url'], catalog[2]['url'], catalog[1]['url']]
+
+
+def test_cold_start_spread(tmp_path):
+    refresher = Refresher(catalog, {}, tmp_path, min_interval=600)
+    now = time.time()
+    refresher._schedule_initial()
+    assert all(now <= due <= now + 601 for due, _, _, _ in refresher._heap)
+
+
+def test_per_host_limit(tmp_path):
+    refresher = StubRefresher(catalog * 3, {}, tmp_path, workers=4, per_host=1,
+                              host_budget=3600000)
+    refresher.run(once=True)
+    assert len(refresher.refreshed) == 9
+    assert max(refresher.max_running.values()) == 1
+
+
+class StubRepository:
+    calls = []
+
+    def __init__(self, url, vendor, settings, debug, compact):
+        pass
+
+    def get_summary(self):
+        self.calls.append('get_summary')
+        return {'stars': 42}
+
+    def get_commits_contributors(self):
+        self.calls.append('get_commits_contributors')
+        return Pending()
+
+
+@pytest.fixture
+def stub_repository(monkeypatch):
+    StubRepository.calls = []
+    monkeypatch.setattr(refresh, "Repository", StubRepository)
+    return StubRepository
+
+
+def test_pending_not_stored(tmp_path, stub_repository):
+    refresher = Refresher(catalog[:1], {}, tmp_path, retry_delay=60,
+                          methods=['get_summary', 'get_commits_contributors'])
+    refresher._running = {"https://github.com": 1}
+    refresher._run_job(catalog[0])
+    refresher._collect(1, once=False)
+
+    # The computed data is stored, the pending one is retried alone
+    data = load(tmp_path, catalog[0]['url'])['data']
+    assert data == {'get_summary': {'stars': 42}}
+    assert refresher._heap[0][0] > time.time() + 50
+    assert refresher._pending[catalog[0]['url']] == (['get_commits_contributors'], 1)
+
+
+def test_pending_keeps_cached(tmp_path, stub_repository):
+    url = catalog[0]['url']
+    store(tmp_path, url, 'github', {'get_commits_contributors': [{'display_name': "johndoe"}]})
+    refresher = Refresher(catalog[:1], {}, tmp_path)
+    assert refresher.refresh(catalog[0], ['get_commits_contributors']) == ['get_commits_contributors']
+    assert load(tmp_path, url)['data'] == {'get_commits_contributors': [{'display_name': "johndoe"}]}
+
+
+def test_pending_once_returns(tmp_path, stub_repository):
+    refresher = Refresher(catalog[:1], {}, tmp_path, retry_delay=0, pending_tries=2,
+                          host_budget=3600000,
+                          methods=['get_summary', 'get_commits_contributors'])
+    thread = threading.Thread(target=refresher.run, kwargs={'once': True})
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert stub_repository.calls == ['get_summary'] + ['get_commits_contributors'] * 3
+    assert load(tmp_path, catalog[0]['url'])['data'] == {'get_summary': {'stars': 42}}
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1, capacity=2)
+    now = bucket.updated_at
+    assert bucket.take(now)
+    assert bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.delay(now) == 1
+    assert bucket.take(now + 1)
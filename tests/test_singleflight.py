@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+import threading
+import time
+
+from repository.singleflight import SingleFlight
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_do_single_call():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'latest_tags': []}
+
+    run_threads(10, lambda: results.append(flight.do('key', fetch)))
+
+    assert len(calls) == 1
+    assert results == [{'latest_tags': []}] * 10
+    # Waiters get their own copy of the result
+    assert len({id(result) for result in results}) == 10
+
+
+def test_do_shared_error():
+    flight = SingleFlight()
+    errors = []
+
+    def fetch():
+        time.sleep(0.1)
+        raise ValueError("API down")
+
+    def call():
+        try:
+            flight.do('key', fetch)
+        except Exception as e:
+            errors.append(e)
+
+    run_threads(5, call)
+
+    # Every caller can catch the original exception type
+    assert len(errors) == 5
+    assert all(isinstance(e, ValueError) for e in errors)
+    originals = [e for e in errors if e.__cause__ is None]
+    assert len(originals) == 1
+    assert all(e.__cause__ is originals[0] for e in errors if e is not originals[0])
+
+
+def test_do_async_cancel():
+    flight = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return "README"
+
+    async def main():
+        tasks = [asyncio.ensure_future(flight.do_async('key', fetch)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        tasks[0].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tasks[0]
+        return await asyncio.gather(*tasks[1:])
+
+    assert asyncio.run(main()) == ["README", "README"]
+    assert len(calls) == 1
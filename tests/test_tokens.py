@@ -0,0 +1,114 @@
+import pytest
+import time
+
+from repository.vendors.tokens import TokenPool, NoTokenAvailable, failover, get_token_pool
+
+
+def test_acquire_most_remaining():
+    pool = TokenPool(["a", "b"])
+    reset_at = time.time() + 3600
+    pool.report("a", remaining=10, limit=5000, reset_at=reset_at)
+    pool.report("b", remaining=4000, limit=5000, reset_at=reset_at)
+    assert pool.acquire("foo/bar") == "b"
+
+
+def test_acquire_failover():
+    pool = TokenPool(["a", "b", "c"])
+    pool.revoke("a")
+    pool.exhaust("b", reset_at=time.time() + 3600)
+    assert pool.acquire("foo/bar") == "c"
+    pool.deny("c", "foo/bar")
+    with pytest.raises(NoTokenAvailable):
+        pool.acquire("foo/bar")
+
+
+def test_acquire_quota_before_known():
+    pool = TokenPool(["a", "b"])
+    reset_at = time.time() + 3600
+    pool.report("a", remaining=1, limit=5000, reset_at=reset_at)
+    pool.report("b", remaining=4999, limit=5000, reset_at=reset_at)
+    pool.allow("a", "foo/bar")
+    assert pool.acquire("foo/bar") == "b"
+
+
+def test_mark_missing():
+    pool = TokenPool(["a", "b"])
+    pool.deny("a", "foo/bar")
+    pool.deny("b", "foo/bar")
+    pool.mark_missing("foo/bar")
+    assert pool.is_missing("foo/bar")
+    assert pool.acquire("foo/bar") in ("a", "b")
+
+
+class RateLimited(Exception):
+    pass
+
+
+class StubVendor:
+
+    def __init__(self, pool):
+        self.token_pool = pool
+        self.reported = []
+        self._connect()
+
+    def _connect(self):
+        self.token = self.token_pool.acquire("foo/bar")
+
+    def _discard_token(self, error):
+        if isinstance(error, RateLimited):
+            self.token_pool.exhaust(self.token)
+            return True
+        return False
+
+    def _report_quota(self):
+        self.reported.append(self.token)
+
+    @failover
+    def get_languages(self):
+        if self.token == "a":
+            raise RateLimited()
+        return {"Python": 100}
+
+
+def test_failover():
+    pool = TokenPool(["a", "b"])
+    pool.report("b", remaining=10, limit=5000, reset_at=time.time() + 3600)
+    vendor = StubVendor(pool)
+    assert vendor.token == "a"
+    assert vendor.get_languages() == {"Python": 100}
+    assert vendor.reported == ["b"]
+
+    pool.exhaust("b")
+    vendor.token = "a"
+    with pytest.raises(RateLimited):
+        vendor.get_languages()
+
+
+def test_report_headers():
+    pool = TokenPool(["a"])
+    reset_at = int(time.time()) + 3600
+    headers = {
+        'X-RateLimit-Remaining': '42',
+        'X-RateLimit-Limit': '5000',
+        'X-RateLimit-Reset': str(reset_at),
+    }
+    pool.report_headers("a", headers)
+    assert pool.quota() == (42, 5000)
+
+    # Older headers of the same window don't give quota back
+    pool.report("a", remaining=100, limit=5000, reset_at=reset_at)
+    assert pool.quota() == (42, 5000)
+
+
+def test_pools_per_tokens():
+    host = "https://github.com"
+    pool_a = get_token_pool('github', host, {'API_TOKEN': "user-a-private"})
+    pool_b = get_token_pool('github', host, {'API_TOKEN': "user-b"})
+    assert pool_a is not pool_b
+    assert pool_b.acquire("Ircam-WAM/TimeSide") == "user-b"
+    assert get_token_pool('github', host, {'API_TOKENS': ["user-b"]}) is pool_b
+
+
+def test_anonymous_pool():
+    pool = get_token_pool('github', "https://github.com", {'API_TOKEN': None})
+    assert pool.acquire("Ircam-WAM/TimeSide") is None
@@ -0,0 +1,29 @@
+from repository.vendors.utils import decode_bounded
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_decode_bounded_complete():
+    data = "# Titre\n\nÉté\n".encode("utf-8")
+    assert decode_bounded(chunked(data, 3), 1024) == ("# Titre\n\nÉté\n", False)
+
+
+def test_decode_bounded_multibyte_split():
+    # "é" is 2 bytes, the limit falls in its middle
+    data = "ab\nété".encode("utf-8")
+    assert decode_bounded(chunked(data, 2), 4) == ("ab\n", True)
+    assert decode_bounded([data], 5) == ("ab\n", True)
+
+
+def test_decode_bounded_line_break():
+    data = b"first line\nsecond line\nthird line\n"
+    assert decode_bounded(chunked(data, 4), 20) == ("first line\n", True)
+
+
+def test_decode_bounded_chunk_boundary():
+    data = b"abcd\nefgh\n"
+    # The limit lands exactly on the end of the second chunk
+    assert decode_bounded(chunked(data, 5), 10) == ("abcd\nefgh\n", False)
+    assert decode_bounded(chunked(data, 5), 5) == ("abcd\n", True)